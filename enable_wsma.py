@@ -1,8 +1,20 @@
 #!/usr/bin/env python
 from __future__ import print_function
 import sys
+import csv
+import json
+import re
+import threading
+import time
+from argparse import ArgumentParser
 from Exscript import Account
 from Exscript.protocols import SSH2
+import wsma
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
 
 transport = ["https", "http", "ssh", "tls"]
 
@@ -15,20 +27,161 @@ wsma agent config
 wsma profile listener WSMA
  transport {transport}
 end
-""".format(transport=transport[0])
+"""
+
+# exec prompt at the very end of the buffer, e.g. after the final 'end'
+exec_prompt = re.compile(r'[\r\n][^\r\n#>(]+#\s*$')
+# IOS errors, e.g. '% Invalid input detected', but not syslog messages
+config_error = re.compile(r'^\s*% .*$', re.M)
+
+
+def enable(ip, username, password, transport=transport[0]):
+    '''Enable WSMA on the given device. The config snippet is sent in
+    one go instead of line by line, then wait for the exec prompt.
+    Raises RuntimeError if the device rejected any of the commands.
+    '''
+    account = Account(name=username, password=password)
+    conn = SSH2()
+    # need this otherwise stupid aruba stuff gets in the way.
+    conn.set_driver('ios')
+    conn.connect(ip)
+    try:
+        conn.login(account)
+        conn.execute('term len 0')
+        conn.execute('conf t')
+        conn.send(cmds.format(transport=transport).replace('\n', '\r'))
+        conn.expect(exec_prompt)
+        errors = config_error.findall(conn.response)
+        if errors:
+            raise RuntimeError('; '.join(e.strip() for e in errors))
+        return conn.response
+    finally:
+        conn.close(force=True)
+
+
+def verify(ip, username, password, transport=transport[0],
+           verify_cert=False):
+    '''Check that WSMA answers on the given device. Returns None if the
+    transport can't be checked with the wsma module.
+    '''
+    if transport in ('https', 'http'):
+        tls = transport == 'https'
+        w = wsma.HTTP(ip, username, password, port=443 if tls else 80,
+                      tls=tls, verify=verify_cert)
+    elif transport == 'ssh':
+        w = wsma.SSH(ip, username, password)
+    else:
+        return None
+    with w as session:
+        return session is not None
+
+
+def provision(device, args):
+    ip, username, password = device
+    result = dict(host=ip, enabled=False, verified=None, error=None)
+    start = time.time()
+    try:
+        enable(ip, username, password, args.transport)
+        result['enabled'] = True
+        result['verified'] = verify(ip, username, password,
+                                    args.transport, args.verify_cert)
+    except Exception as e:
+        result['error'] = '%s' % e
+    result['elapsed'] = round(time.time() - start, 3)
+    return result
+
+
+def read_inventory(f, username, password):
+    '''Yield (host, username, password) from CSV lines of
+    host[,username[,password]], empty lines and # comments are skipped.
+    '''
+    for row in csv.reader(f):
+        if not row or not row[0].strip() or row[0].startswith('#'):
+            continue
+        row = [field.strip() for field in row] + [None, None]
+        yield row[0], row[1] or username, row[2] or password
+
+
+def bulk(args):
+    '''Provision all devices of the inventory with bounded concurrency,
+    writing one JSON line per device to the report as each finishes.
+    '''
+    # bounded, so the inventory is read only as fast as it is worked off
+    work = queue.Queue(maxsize=2 * args.workers)
+    lock = threading.Lock()
+    report = sys.stdout if args.report == '-' else open(args.report, 'w')
+
+    def worker():
+        while True:
+            device = work.get()
+            if device is None:
+                break
+            result = provision(device, args)
+            with lock:
+                report.write(json.dumps(result) + '\n')
+                report.flush()
+
+    threads = [threading.Thread(target=worker) for _ in range(args.workers)]
+    for t in threads:
+        t.start()
+
+    f = sys.stdin if args.inventory == '-' else open(args.inventory)
+    try:
+        for device in read_inventory(f, args.username, args.password):
+            work.put(device)
+    finally:
+        for _ in threads:
+            work.put(None)
+        for t in threads:
+            t.join()
+        if f is not sys.stdin:
+            f.close()
+        if report is not sys.stdout:
+            report.close()
 
 
 def main(argv):
     # logging.basicConfig(level=logging.DEBUG)
-    ip = argv[0]
-    username = argv[1]
-    password = argv[2]
-    account = Account(name=username, password=password)
+    parser = ArgumentParser(description='Enable WSMA on devices')
+    parser.add_argument('ip', type=str, nargs='?',
+                        help="The device IP or DN")
+    parser.add_argument('username', type=str, nargs='?',
+                        help="Username for device")
+    parser.add_argument('password', type=str, nargs='?',
+                        help="Password for specified user")
+    parser.add_argument('-i', '--inventory', type=str,
+                        help="CSV file with host[,username[,password]] "
+                             "per line ('-' for stdin), enables bulk mode")
+    parser.add_argument('-w', '--workers', type=int, default=20,
+                        help="Devices provisioned in parallel (bulk mode)")
+    parser.add_argument('-r', '--report', type=str, default='-',
+                        help="JSON lines report file (bulk mode), "
+                             "default is stdout")
+    parser.add_argument('-t', '--transport', choices=transport,
+                        default=transport[0],
+                        help="WSMA transport to configure")
+    parser.add_argument('--verify-cert', default=False, action='store_true',
+                        help="Verify the device certificate when checking "
+                             "the HTTPS transport")
+    args = parser.parse_args(argv)
+
+    if args.inventory is not None:
+        if args.ip is not None:
+            # in bulk mode, positional args are the default credentials
+            args.ip, args.username, args.password = (None, args.ip,
+                                                     args.username)
+        bulk(args)
+        return
+
+    if args.password is None:
+        parser.error("ip, username and password are required")
+
+    account = Account(name=args.username, password=args.password)
     # conn = SSH2(debug=5)
     conn = SSH2()
     # need this otherwise stupid aruba stuff gets in the way.
     conn.set_driver('ios')
-    conn.connect(ip)
+    conn.connect(args.ip)
     conn.login(account)
     conn.execute('term len 0')
     conn.execute('show clock')
@@ -36,7 +189,7 @@ def main(argv):
     conn.execute('conf t')
     print(conn.response.strip())
 
-    for cmd in cmds.split("\n"):
+    for cmd in cmds.format(transport=args.transport).split("\n"):
         conn.execute(cmd)
         print(conn.response)
 
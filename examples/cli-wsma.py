@@ -1,14 +1,109 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-""" simple CLI tool, only show commands supported """
+""" simple CLI tool, only show commands supported
+
+with --hosts, runs non-interactively: every command is run on every
+host and one JSON line per result is written to stdout as soon as it
+is available.
+"""
 
 from __future__ import print_function
 import wsma
 from argparse import ArgumentParser
+import json
 import logging
 import readline
 import sys
+import threading
+import time
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+
+def read_lines(name):
+    """ yield stripped, non-empty lines from file name or stdin ('-') """
+    f = sys.stdin if name == '-' else open(name)
+    try:
+        for line in f:
+            line = line.strip()
+            if len(line) > 0 and not line.startswith('#'):
+                yield line
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+
+def fleet(args):
+    """ run all commands on all hosts with a bounded number of workers """
+
+    commands = list(read_lines(args.commands))
+    # bounded, hosts are only read as fast as they are worked off
+    hosts = queue.Queue(maxsize=2 * args.workers)
+    lock = threading.Lock()
+
+    def emit(result):
+        line = json.dumps(result, default=str)
+        with lock:
+            sys.stdout.write(line + '\n')
+            sys.stdout.flush()
+
+    def session(host):
+        if args.ssh:
+            return wsma.SSH(host, args.username, args.password,
+                            port=args.port or 22)
+        return wsma.HTTP(host, args.username, args.password,
+                         port=args.port or 80, tls=not args.notls)
+
+    def run(host):
+        start = time.time()
+        try:
+            w = session(host)
+            w.connect()
+        except Exception as e:
+            emit(dict(host=host, command=None, success=False,
+                      latency=round(time.time() - start, 3),
+                      output='%s' % e))
+            return
+        try:
+            for cmd in commands:
+                start = time.time()
+                ok = w.execCLI(cmd, format_spec=args.format_spec)
+                result = dict(host=host, command=cmd, success=bool(ok),
+                              latency=round(time.time() - start, 3))
+                if args.format_spec is not None and ok:
+                    result['tree'] = w.odmFormatResult
+                else:
+                    result['output'] = w.output
+                emit(result)
+        finally:
+            w.disconnect()
+
+    def worker():
+        while True:
+            host = hosts.get()
+            if host is None:
+                break
+            try:
+                run(host)
+            except Exception as e:
+                logging.error("{}: {}".format(host, e))
+
+    threads = [threading.Thread(target=worker) for _ in range(args.workers)]
+    for t in threads:
+        t.start()
+    try:
+        for host in read_lines(args.hosts):
+            hosts.put(host)
+    finally:
+        for _ in threads:
+            hosts.put(None)
+        for t in threads:
+            t.join()
+
 
 def main(argv):
 
@@ -17,23 +112,47 @@ def main(argv):
 
     # Get who to talk to and username and password
     parser = ArgumentParser(description='Provide device parameters:')
-    parser.add_argument('host', type=str,
+    parser.add_argument('host', type=str, nargs='?',
                         help="The device IP or DN")
     parser.add_argument('username', type=str, default='cisco', nargs='?',
                         help="Username for device, default is 'cisco'")
     parser.add_argument('password', type=str, default='cisco', nargs='?',
                         help="Password for specified user, default is 'cisco'")
-    parser.add_argument('-p', '--port', type=int, default=80,
-                        help="Port of WSMA agent.")
+    parser.add_argument('-p', '--port', type=int, default=None,
+                        help="Port of WSMA agent, default is 80 (22 for SSH)")
     parser.add_argument('-n', '--notls', default=False, action='store_true',
                         help="Don't use TLS")
     parser.add_argument('-l', '--loglevel', type=int, choices=range(0, 5),
                         default=2, help="loglevel, 0-4 (default is 2)")
+    parser.add_argument('-H', '--hosts', type=str,
+                        help="File with one host per line ('-' for stdin), "
+                             "runs non-interactively")
+    parser.add_argument('-c', '--commands', type=str, default='-',
+                        help="File with one command per line ('-' for "
+                             "stdin, the default)")
+    parser.add_argument('-s', '--ssh', default=False, action='store_true',
+                        help="Use SSH instead of HTTP(S) with --hosts")
+    parser.add_argument('-w', '--workers', type=int, default=20,
+                        help="Hosts worked on concurrently with --hosts")
+    parser.add_argument('-f', '--format-spec', type=str, default=None,
+                        help="ODM format spec for the commands with --hosts")
     args = parser.parse_args()
 
     # setup logging
     logging.getLogger().setLevel(logging.CRITICAL - (args.loglevel) * 10)
 
+    if args.hosts is not None:
+        if args.host is not None:
+            # no host with --hosts, positional args are the credentials
+            args.username, args.password = args.host, args.username
+        if args.hosts == '-' and args.commands == '-':
+            parser.error("hosts and commands can't both be read from stdin")
+        fleet(args)
+        return
+
+    if args.host is None:
+        parser.error("host is required")
+
     def do(line, config=False):
         cfg = 'CFG' if config else 'CLI'
         print("{}: '{}' ==> ".format(cfg, line), end='')
@@ -57,7 +176,7 @@ def main(argv):
 
     # Create the WSMA utility
     with wsma.HTTP(args.host, args.username, args.password,
-                   port=args.port, tls=not args.notls) as w:
+                   port=args.port or 80, tls=not args.notls) as w:
         # do we have a working connection?
         if w is None:
             logging.critical('something went wrong, aborting...')
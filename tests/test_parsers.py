@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+
+""" Offline tests of the show command parsers with sample outputs """
+
+import unittest
+
+from wsma import parsers
+
+
+IP_INTERFACE_BRIEF = """\
+Interface              IP-Address      OK? Method Status                Protocol
+GigabitEthernet0/0     192.168.1.1     YES NVRAM  up                    up
+GigabitEthernet0/1     unassigned      YES NVRAM  administratively down down
+Loopback0              10.255.0.1      YES manual up                    up
+Tunnel10               10.10.10.1      YES manual up                    down
+"""
+
+IP_ROUTE = """\
+Codes: L - local, C - connected, S - static, R - RIP, M - mobile, B - BGP
+       D - EIGRP, EX - EIGRP external, O - OSPF, IA - OSPF inter area
+       * - candidate default, U - per-user static route, o - ODR
+
+Gateway of last resort is 192.168.1.254 to network 0.0.0.0
+
+S*    0.0.0.0/0 [1/0] via 192.168.1.254
+      10.0.0.0/8 is variably subnetted, 4 subnets, 2 masks
+C        10.1.1.0/24 is directly connected, GigabitEthernet0/1
+L        10.1.1.1/32 is directly connected, GigabitEthernet0/1
+D EX     10.200.200.0/24
+           [170/3072] via 10.1.1.2, 1d02h, GigabitEthernet0/1
+O IA     10.3.0.0/16 [110/2] via 10.1.1.2, 00:10:05, GigabitEthernet0/1
+                     [110/2] via 10.1.1.3, 00:10:05, GigabitEthernet0/1
+      172.16.0.0/24 is subnetted, 2 subnets
+D        172.16.1.0 [90/156160] via 10.1.1.2, 2w0d, GigabitEthernet0/1
+D        172.16.2.0 [90/156160] via 10.1.1.2, 2w0d, GigabitEthernet0/1
+C     192.168.100.0/24
+         is directly connected, GigabitEthernet0/2
+D EX     192.168.200.0/24
+"""
+
+INVENTORY = """\
+NAME: "CISCO2911/K9 chassis", DESCR: "CISCO2911/K9 chassis"
+PID: CISCO2911/K9      , VID: V06 , SN: FTX1234A5BC
+
+NAME: "C2911 Mother board 3GE, integrated VPN and 4W", DESCR: "C2911 Mother board 3GE, integrated VPN and 4W"
+PID: CISCO2911/K9      , VID: V06 , SN: FOC12345678
+"""
+
+VERSION_ISR_G2 = """\
+Cisco IOS Software, C2900 Software (C2900-UNIVERSALK9-M), Version 15.1(4)M4, RELEASE SOFTWARE (fc1)
+Technical Support: http://www.cisco.com/techsupport
+ROM: System Bootstrap, Version 15.0(1r)M15, RELEASE SOFTWARE (fc1)
+
+rtr-isr2 uptime is 1 year, 2 weeks, 3 days, 4 hours, 5 minutes
+System returned to ROM by power-on
+System image file is "flash0:c2900-universalk9-mz.SPA.151-4.M4.bin"
+
+Cisco CISCO2911/K9 (revision 1.0) with 483328K/40960K bytes of memory.
+Processor board ID FTX1234A5BC
+3 Gigabit Ethernet interfaces
+
+Configuration register is 0x2102
+"""
+
+VERSION_CSR = """\
+Cisco IOS XE Software, Version 16.09.03
+Cisco IOS Software [Fuji], Virtual XE Software (X86_64_LINUX_IOSD-UNIVERSALK9-M), Version 16.9.3, RELEASE SOFTWARE (fc2)
+csr1 uptime is 3 hours, 2 minutes
+System image file is "bootflash:packages.conf"
+cisco CSR1000V (VXE) processor (revision VXE) with 2392579K/3075K bytes of memory.
+Processor board ID 9XYZ1A2B3C4
+Configuration register is 0x2102
+"""
+
+
+class LookupTest(unittest.TestCase):
+
+    def test_abbreviated(self):
+        self.assertIs(parsers.lookup('sh ip int br'),
+                      parsers.ip_interface_brief)
+        self.assertIs(parsers.lookup('SH VER'), parsers.version)
+
+    def test_pipe_is_ignored(self):
+        self.assertIs(parsers.lookup('show ip route | exclude 10.'),
+                      parsers.ip_route)
+
+    def test_unknown(self):
+        self.assertIsNone(parsers.lookup('show clock'))
+        self.assertIsNone(parsers.parse('show clock', 'x'))
+        self.assertIsNone(parsers.parse('show version', None))
+
+
+class IpInterfaceBriefTest(unittest.TestCase):
+
+    def test_records(self):
+        records = parsers.parse('show ip interface brief',
+                                IP_INTERFACE_BRIEF)
+        self.assertEqual([r['interface'] for r in records],
+                         ['GigabitEthernet0/0', 'GigabitEthernet0/1',
+                          'Loopback0', 'Tunnel10'])
+        self.assertEqual(records[0], dict(
+            interface='GigabitEthernet0/0', ip_address='192.168.1.1',
+            ok='YES', method='NVRAM', status='up', protocol='up'))
+
+    def test_administratively_down(self):
+        record = parsers.ip_interface_brief(IP_INTERFACE_BRIEF)[1]
+        self.assertEqual(record['ip_address'], 'unassigned')
+        self.assertEqual(record['status'], 'administratively down')
+        self.assertEqual(record['protocol'], 'down')
+
+
+class IpRouteTest(unittest.TestCase):
+
+    def setUp(self):
+        self.routes = dict((r['prefix'], r)
+                           for r in parsers.ip_route(IP_ROUTE))
+
+    def test_prefixes(self):
+        self.assertEqual(sorted(self.routes), sorted([
+            '0.0.0.0/0', '10.1.1.0/24', '10.1.1.1/32', '10.200.200.0/24',
+            '10.3.0.0/16', '172.16.1.0/24', '172.16.2.0/24',
+            '192.168.100.0/24']))
+
+    def test_default_route(self):
+        route = self.routes['0.0.0.0/0']
+        self.assertEqual(route['code'], 'S*')
+        self.assertEqual(route['paths'], [dict(
+            next_hop='192.168.1.254', interface=None, distance=1,
+            metric=0, age=None)])
+
+    def test_wrapped_external(self):
+        route = self.routes['10.200.200.0/24']
+        self.assertEqual(route['code'], 'D EX')
+        self.assertEqual(route['paths'], [dict(
+            next_hop='10.1.1.2', interface='GigabitEthernet0/1',
+            distance=170, metric=3072, age='1d02h')])
+
+    def test_wrapped_connected(self):
+        route = self.routes['192.168.100.0/24']
+        self.assertEqual(route['code'], 'C')
+        self.assertEqual(route['paths'][0]['interface'],
+                         'GigabitEthernet0/2')
+
+    def test_wrapped_without_path_is_dropped(self):
+        self.assertNotIn('192.168.200.0/24', self.routes)
+
+    def test_multiple_paths(self):
+        route = self.routes['10.3.0.0/16']
+        self.assertEqual(route['code'], 'O IA')
+        self.assertEqual([p['next_hop'] for p in route['paths']],
+                         ['10.1.1.2', '10.1.1.3'])
+
+    def test_subnetted_mask(self):
+        route = self.routes['172.16.1.0/24']
+        self.assertEqual(route['code'], 'D')
+        self.assertEqual(route['paths'][0]['age'], '2w0d')
+
+    def test_connected(self):
+        route = self.routes['10.1.1.1/32']
+        self.assertEqual(route['code'], 'L')
+        self.assertEqual(route['paths'][0]['next_hop'], None)
+
+
+class InventoryTest(unittest.TestCase):
+
+    def test_records(self):
+        records = parsers.parse('show inventory', INVENTORY)
+        self.assertEqual(len(records), 2)
+        self.assertEqual(records[0], dict(
+            name='CISCO2911/K9 chassis', descr='CISCO2911/K9 chassis',
+            pid='CISCO2911/K9', vid='V06', sn='FTX1234A5BC'))
+        self.assertEqual(records[1]['sn'], 'FOC12345678')
+
+
+class VersionTest(unittest.TestCase):
+
+    def test_isr_g2(self):
+        record, = parsers.parse('show version', VERSION_ISR_G2)
+        self.assertEqual(record, dict(
+            version='15.1(4)M4', hostname='rtr-isr2',
+            uptime='1 year, 2 weeks, 3 days, 4 hours, 5 minutes',
+            image='flash0:c2900-universalk9-mz.SPA.151-4.M4.bin',
+            platform='CISCO2911/K9', serial='FTX1234A5BC',
+            config_register='0x2102'))
+
+    def test_processor_line(self):
+        record, = parsers.version(VERSION_CSR)
+        self.assertEqual(record['platform'], 'CSR1000V')
+        self.assertEqual(record['hostname'], 'csr1')
+        self.assertEqual(record['serial'], '9XYZ1A2B3C4')
+
+    def test_missing_fields(self):
+        record, = parsers.version('nothing to see here\n')
+        self.assertEqual(set(record.values()), set([None]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -30,6 +30,7 @@ https://developer.cisco.com/fileMedia/download/c3c98397-5204-4ae6-8678-782239d05
 
 from .http import HTTP
 from .ssh import SSH
+from .replay import Replay
 
 __version__ = "0.4.2"
 __author__ = 'Adam Radford'
@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+
+"""
+On-disk archive of WSMA requests and responses.
+
+An archive consists of two files:
+
+- <path>.dat holds the records, each one a zlib compressed JSON object
+  with the request envelope and the raw response. It is append-only.
+- <path>.idx holds one JSON line per record with the record key
+  (host, operation, command and format_spec), its offset and length
+  in the data file.
+
+Sessions record into an archive when given as recorder:
+
+    archive = Archive('fleet-capture')
+    with wsma.HTTP(host, user, password, recorder=archive) as w:
+        w.execCLI('show version')
+
+and the :class:`Replay <wsma.replay.Replay>` transport serves the
+recorded responses again. Reads are done from a memory map of the data
+file, only the requested record is decompressed.
+"""
+
+import json
+import mmap
+import os
+import re
+import threading
+import time
+import zlib
+import logging
+
+
+class Archive(object):
+    '''An append-only, compressed archive of responses.
+
+    If the same request has been recorded more than once then the
+    most recent record is returned by lookup.
+
+    :param path: path of the archive without extension (str)
+    :param level: zlib compression level (int)
+    '''
+
+    PASSWORD = re.compile(r'(<wsse:Password>).*?(</wsse:Password>)', re.S)
+
+    def __init__(self, path, level=6):
+        super(Archive, self).__init__()
+        self.path = path
+        self.level = level
+        self._lock = threading.Lock()
+        self._index = dict()
+        self._data = None
+        self._idx = None
+        self._map = None
+        # a crash while writing may have left an incomplete last line
+        self._terminated = True
+
+        if os.path.exists(self.path + '.idx'):
+            self._load()
+        logging.debug("archive {} has {} entries".format(self.path,
+                                                         len(self._index)))
+
+    def _load(self):
+        '''Read the index, skipping entries which are incomplete or
+        point beyond the end of the data file.
+        '''
+        try:
+            size = os.path.getsize(self.path + '.dat')
+        except OSError:
+            size = 0
+        with open(self.path + '.idx') as f:
+            for line in f:
+                self._terminated = line.endswith('\n')
+                try:
+                    entry = json.loads(line)
+                    key = self._key(*entry['key'])
+                    offset, length = entry['offset'], entry['length']
+                except (ValueError, KeyError, TypeError):
+                    logging.warning("skipping incomplete index entry of "
+                                    "{}: {!r}".format(self.path, line))
+                    continue
+                if offset + length > size:
+                    logging.warning("skipping index entry of {} beyond the "
+                                    "end of the data: {}".format(self.path,
+                                                                 key))
+                    continue
+                self._index[key] = (offset, length)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __len__(self):
+        return len(self._index)
+
+    @staticmethod
+    def _key(host, operation, command, format_spec):
+        return (host, operation, command, format_spec)
+
+    def record(self, host, request, envelope, response):
+        '''Append a request / response pair to the archive. The password
+        in the request envelope is masked.
+
+        :param host: host the request was sent to (str)
+        :param request: tuple of (operation, command, format_spec)
+        :param envelope: XML request as sent to the device (str)
+        :param response: raw XML response (str)
+        '''
+        key = self._key(host, *request)
+        if envelope is not None:
+            envelope = self.PASSWORD.sub(r'\1***\2', envelope)
+        record = dict(key=key, time=time.time(),
+                      request=envelope, response=response)
+        blob = zlib.compress(json.dumps(record).encode('utf-8'), self.level)
+
+        with self._lock:
+            if self._data is None:
+                self._data = open(self.path + '.dat', 'ab')
+                self._idx = open(self.path + '.idx', 'a')
+                if not self._terminated:
+                    self._idx.write('\n')
+                    self._terminated = True
+            self._data.seek(0, os.SEEK_END)
+            offset = self._data.tell()
+            self._data.write(blob)
+            self._data.flush()
+            self._idx.write(json.dumps(dict(key=key, offset=offset,
+                                            length=len(blob))) + '\n')
+            self._idx.flush()
+            self._index[key] = (offset, len(blob))
+
+    def _read(self, offset, length):
+        with self._lock:
+            if self._map is None or len(self._map) < offset + length:
+                if self._map is not None:
+                    self._map.close()
+                with open(self.path + '.dat', 'rb') as f:
+                    self._map = mmap.mmap(f.fileno(), 0,
+                                          access=mmap.ACCESS_READ)
+            blob = self._map[offset:offset + length]
+        return json.loads(zlib.decompress(blob).decode('utf-8'))
+
+    def lookup(self, host, request):
+        '''Return the recorded record for the given request or None.
+        The record is a dict with key, time, request and response.
+
+        :param host: host the request was sent to (str)
+        :param request: tuple of (operation, command, format_spec)
+        :rtype: dict
+        '''
+        entry = self._index.get(self._key(host, *request))
+        if entry is None:
+            return None
+        return self._read(*entry)
+
+    def keys(self):
+        '''All recorded keys as (host, operation, command, format_spec).
+        :rtype: list
+        '''
+        return list(self._index.keys())
+
+    def responses(self):
+        '''Iterate over the most recent response of all recorded keys,
+        e.g. to feed them into a parser benchmark.
+
+        :rtype: generator of (key, response)
+        '''
+        for key, entry in sorted(self._index.items(),
+                                 key=lambda item: item[1][0]):
+            yield key, self._read(*entry)['response']
+
+    def close(self):
+        '''Close the underlying files.
+        '''
+        with self._lock:
+            for f in (self._data, self._idx, self._map):
+                if f is not None:
+                    f.close()
+            self._data = self._idx = self._map = None
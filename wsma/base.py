@@ -8,6 +8,7 @@ from abc import ABCMeta, abstractmethod
 from jinja2 import Template
 from xml.dom.minidom import parseString
 from xml.parsers.expat import ExpatError
+from wsma.health import CLOSED, HALF_OPEN
 import xmltodict
 import json
 import time
@@ -95,6 +96,30 @@ class _ConfigPersistTemplate(_Schema):
                                         self.end_schema))
 
 
+class _ChunkReader(object):
+    '''File-like object reading from an iterable of byte chunks, the
+    parser may not be handed more than the requested size.
+    '''
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._chunk = b''
+        self._pos = 0
+
+    def read(self, size=-1):
+        while self._pos >= len(self._chunk):
+            try:
+                self._chunk = next(self._chunks)
+            except StopIteration:
+                return b''
+            self._pos = 0
+        if size < 0:
+            size = len(self._chunk)
+        data = self._chunk[self._pos:self._pos + size]
+        self._pos += len(data)
+        return data
+
+
 class Base(object):
     '''The base class for all WSMA transports.
 
@@ -112,11 +137,31 @@ class Base(object):
     :param password: password for the username
     :param port: port to connect to
     :param timeout: timeout for transport
+    :param parser: optional :class:`ParsePool <wsma.offload.ParsePool>`
+                   to offload response parsing to
+    :param recorder: optional :class:`Archive <wsma.archive.Archive>`
+                     to record requests and responses into
+    :param persist_window: if None, configPersist writes the config
+                           immediately. Otherwise persist requests are
+                           deferred and merged: they are written out by
+                           the first configPersist call after
+                           persist_window seconds have passed or at the
+                           latest when the session is disconnected.
+                           There is no timer, a long-lived session which
+                           doesn't call configPersist again keeps the
+                           change unsaved until it disconnects (or
+                           flushPersist is called). 0 defers until the
+                           session is disconnected.
+    :param health: optional :class:`HealthTracker <wsma.health.HealthTracker>`
+                   to report failures to and to fail fast for hosts
+                   known to be unhealthy
     '''
 
     __metaclass__ = ABCMeta
 
-    def __init__(self, host, username, password, port, timeout=60):
+    def __init__(self, host, username, password, port, timeout=60,
+                 parser=None, recorder=None, persist_window=None,
+                 health=None):
         super(Base, self).__init__()
 
         if not host:
@@ -130,6 +175,20 @@ class Base(object):
         self.success = False
         self.output = ''
         self.data = None
+        self.parser = parser
+        self.recorder = recorder
+        # identifies the request currently in progress as a
+        # tuple of (operation, command, format_spec)
+        self._request = None
+        self._envelope = None
+        self.persist_window = persist_window
+        # was there a successful config change since the last persist?
+        self._dirty = False
+        # when a deferred persist is due, None if none is pending
+        self._persist_due = None
+        self.health = health
+        # set while this session probes a half-open circuit
+        self._probing = False
 
         # session holds the transport session
         self._session = None
@@ -183,50 +242,91 @@ class Base(object):
                   if not successful
         - xml_data: holds the XML data received from the device
 
+        If a parse pool is set for this session then parsing and
+        evaluation is done by one of the pool's worker processes, data
+        is then a minimal response dict (see :class:`ParseResult
+        <wsma.offload.ParseResult>`).
+        If a recorder is set then the raw response is archived first.
+
         :param data: dictionary with response data
         :rtype: bool
         '''
+        if self.recorder is not None and self._request is not None:
+            self.recorder.record(self.host, self._request,
+                                 self._envelope, xml_data)
+
+        if self.parser is not None:
+            result = self.parser.parse(xml_data, self.timeout)
+            self.data = result.data
+            return self._update(result.ok, result.success, result.output)
+
         self.data = self.parseXML(xml_data)
+        return self._update(*self.evaluate(self.data))
+
+    def _update(self, ok, success, output):
+        '''Update success and output from an evaluated response.
+        None values leave the respective instance var untouched.
+
+        :param ok: the return value of the processing
+        :param success: new value for self.success or None
+        :param output: new value for self.output or None
+        :rtype: bool
+        '''
+        if success is not None:
+            self.success = success
+        if output is not None:
+            self.output = output
+        return ok
+
+    @staticmethod
+    def evaluate(data):
+        '''Evaluate the given response dict (as returned by parseXML).
+        This does not depend on any session state and can therefore
+        also be run in a different process.
+
+        Returns a tuple (ok, success, output) where ok is the overall
+        result and success / output are None if they could not be
+        determined from the response.
+
+        :param data: dictionary with response data
+        :rtype: tuple
+        '''
         # did the parsing yield an error?
-        if self.data.get('error') is not None:
-            return False
+        if data.get('error') is not None:
+            return False, None, None
 
-        logging.info("JSON data: %s", json.dumps(self.data, indent=4))
+        logging.info("JSON data: %s", json.dumps(data, indent=4))
 
         # was it successful?
         try:
-            self.success = bool(int(self.data['response']['@success']))
+            success = bool(int(data['response']['@success']))
         except KeyError:
-            self.output = 'unknown error / key error'
-            return False
+            return False, None, 'unknown error / key error'
 
         # exec mode?
-        if self.data['response']['@xmlns'] == "urn:cisco:wsma-exec":
-            if self.success:
+        if data['response']['@xmlns'] == "urn:cisco:wsma-exec":
+            if success:
                 try:
-                    t = self.data['response']['execLog'][
+                    t = data['response']['execLog'][
                         'dialogueLog']['received']['text']
                 except KeyError:
                     t = None
                 t = '' if t is None else t
-                self.output = t
-                return True
+                return True, success, t
 
-            if not self.success:
-                e = self.data['response']['execLog'][
+            if not success:
+                e = data['response']['execLog'][
                     'errorInfo']['errorMessage']
-                self.output = e
-                return False
+                return False, success, e
 
         # config mode?
-        if self.data['response']['@xmlns'] == "urn:cisco:wsma-config":
-            if self.success:
+        if data['response']['@xmlns'] == "urn:cisco:wsma-config":
+            if success:
                 t = 'config mode / not applicable'
-                self.output = t
-                return True
+                return True, success, t
 
-            if not self.success:
-                re = self.data['response']['resultEntry']
+            if not success:
+                re = data['response']['resultEntry']
                 # multi line config input returns list
                 if type(re) is list:
                     results = re
@@ -237,12 +337,11 @@ class Base(object):
                 # look for first failed element
                 for line in results:
                     if line.get('failure'):
-                        self.output = line.get('text')
-                        break
-                return False
+                        return False, success, line.get('text')
+                return False, success, None
 
         # catch all
-        return False
+        return False, success, None
 
     @abstractmethod
     def communicate(self, template_data):
@@ -260,6 +359,11 @@ class Base(object):
         self.success= True
         self.output = ''
         self.data = None
+        self._envelope = template_data
+
+        # fail fast if the host is known to be unhealthy
+        if not self._healthy():
+            return self.success
 
         # make sure we have a session
         if self._session == None:
@@ -268,6 +372,52 @@ class Base(object):
 
         return self.success
 
+    def _healthy(self):
+        '''Checks the circuit of the host with the health tracker, if
+        any. If the circuit is half-open then this session probes the
+        host with a ping first.
+
+        :rtype: bool
+        '''
+        if self.health is None or self._probing:
+            return True
+
+        state = self.health.check(self.host)
+        if state == HALF_OPEN:
+            request, envelope = self._request, self._envelope
+            self._probing = True
+            try:
+                self._ping()
+            finally:
+                self._probing = False
+                self._request, self._envelope = request, envelope
+            state = self.health.state(self.host)
+
+        if state == CLOSED:
+            self.success = True
+            self.output = ''
+            self.data = None
+            return True
+
+        self.output = 'host unhealthy, {}'.format(
+            self.health.error(self.host))
+        self.success = False
+        return False
+
+    def _reportHealth(self, kind=None, error=None):
+        '''Reports the outcome of an exchange with the host to the
+        health tracker, if any. kind is None on success.
+
+        :param kind: 'connect', 'auth', 'timeout' or 'overload'
+        :param error: the error message or exception
+        '''
+        if self.health is None:
+            return
+        if kind is None:
+            self.health.success(self.host)
+        else:
+            self.health.failure(self.host, kind, error)
+
     @abstractmethod
     def connect(self):
         '''Connects to the WSMA host via a specific transport.
@@ -320,6 +470,7 @@ class Base(object):
             format_text = 'format="%s"' % format_spec
         else:
             format_text = ""
+        self._request = ('exec', command, format_spec)
         etmplate = _ExecTemplate()
         template_data = etmplate.template.render(EXEC_CMD=command,
                                                  TIMEOUT=self.timeout,
@@ -341,6 +492,7 @@ class Base(object):
         correlator = self._buildCorrelator("config")
         fail_str = 'action-on-fail="%s"' % action_on_fail
         self._count += 1
+        self._request = ('config', command, None)
         etmplate = _ConfigTemplate()
         template_data = etmplate.template.render(CONFIG_CMD=command,
                                                  CORRELATOR=correlator,
@@ -348,20 +500,80 @@ class Base(object):
                                                  Username=self.username,
                                                  Password=self.password)
         logging.debug("Template {0:s}".format(template_data))
-        return self.communicate(template_data)
+        result = self.communicate(template_data)
+        if result:
+            self._dirty = True
+        return result
 
     def configPersist(self):
         '''Makes configuration changes persistent.
 
+        With a persist_window set, the write is deferred and merged
+        with other persist requests, see :meth:`flushPersist`. Note
+        that a deferred write only happens on a later configPersist
+        call, flushPersist or disconnect, not when the window ends. If no
+        config change was done since the last write then there is
+        nothing to persist and the device is not contacted.
+
+        :rtype: bool
+        '''
+        if self.persist_window is None:
+            return self._persist()
+
+        if not self._dirty:
+            self.success = True
+            self.output = 'nothing to persist'
+            return True
+
+        now = time.time()
+        if self._persist_due is None:
+            self._persist_due = now + self.persist_window
+        if self.persist_window > 0 and now >= self._persist_due:
+            return self.flushPersist()
+
+        self.success = True
+        self.output = 'config persist deferred'
+        return True
+
+    def flushPersist(self):
+        '''Writes out a pending deferred persist request, if any.
+        Called automatically when the session is disconnected.
+
+        :rtype: bool
+        '''
+        if self._persist_due is None:
+            return True
+        logging.info("flushing deferred config persist")
+        return self._persist()
+
+    def _flushOnDisconnect(self):
+        '''Writes out a pending deferred persist request before the
+        transport goes away. To be called by the subclasses' disconnect
+        while the transport is still usable.
+        '''
+        if self._persist_due is None:
+            return
+        if not self.flushPersist():
+            logging.warning("deferred config persist lost on disconnect: "
+                            "{}".format(self.output))
+
+    def _persist(self):
+        '''Sends the configPersist request to the device.
+
         :rtype: bool
         '''
         correlator = self._buildCorrelator("config-persist")
+        self._request = ('config-persist', '', None)
         etmplate = _ConfigPersistTemplate()
         template_data = etmplate.template.render(CORRELATOR=correlator,
                                                  Username=self.username,
                                                  Password=self.password)
         logging.debug("Template {0:s}".format(template_data))
-        return self.communicate(template_data)
+        result = self.communicate(template_data)
+        if result:
+            self._dirty = False
+            self._persist_due = None
+        return result
 
     @staticmethod
     def parseXML(xml_text):
@@ -405,3 +617,34 @@ class Base(object):
             dom.getElementsByTagNameNS(
                 "http://schemas.xmlsoap.org/soap/envelope/",
                 "Envelope")[0].toxml())
+
+    @staticmethod
+    def parseXMLStream(chunks):
+        '''Like :meth:`parseXML`, but parses the XML incrementally from
+        an iterable of byte chunks as they arrive, without holding the
+        whole document in memory.
+
+        :param chunks: iterable of bytes, e.g. a response body iterator
+        :rtype: dict
+        '''
+        try:
+            doc = xmltodict.parse(_ChunkReader(chunks))
+        except ExpatError as e:
+            return dict(error='%s' % e)
+
+        # depth first, in document order, like getElementsByTagName
+        stack = [doc]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, list):
+                stack.extend(reversed(node))
+            elif isinstance(node, dict):
+                if 'response' in node:
+                    response = node['response']
+                    if isinstance(response, list):
+                        response = response[0]
+                    return dict(response=response)
+                stack.extend(reversed([v for k, v in node.items()
+                                       if not k.startswith(('@', '#'))]))
+
+        return doc
@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*-
+
+"""
+Per-device request dispatching with priorities.
+
+A WSMA session handles one request at a time. When several callers
+share a device, e.g. bulk polling and interactive troubleshooting, a
+:class:`Dispatcher` in front of the session orders their requests:
+
+- requests of a higher priority class run first
+- within a class, callers (by default: threads) are served round-robin,
+  one request each
+- the queue depth is bounded, low priority work is shed first
+
+    with wsma.HTTP(host, user, password) as w:
+        with Dispatcher(w) as d:
+            r = d.execCLI('show clock', priority=INTERACTIVE)
+            r.wait()
+            print(r.output)
+"""
+
+from collections import OrderedDict, deque
+import itertools
+import threading
+import logging
+
+INTERACTIVE = 0
+NORMAL = 1
+BULK = 2
+
+
+class Request(object):
+    '''A request queued with a :class:`Dispatcher`. Once done, it holds
+    a snapshot of the session results:
+
+    - ok: the return value of the session method
+    - success, output, data: the respective session attributes
+    - error: exception raised by the session method, if any
+    '''
+
+    def __init__(self, name, args, kwargs, priority, caller):
+        self.name = name
+        self.args = args
+        self.kwargs = kwargs
+        self.priority = priority
+        self.caller = caller
+        self.ok = False
+        self.success = False
+        self.output = ''
+        self.data = None
+        self.error = None
+        self._done = threading.Event()
+
+    @property
+    def done(self):
+        '''Has the request been processed (or shed)?
+        :rtype bool:
+        '''
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        '''Wait for the request to be processed.
+
+        :param timeout: max seconds to wait, None waits forever
+        :rtype: bool
+        '''
+        self._done.wait(timeout)
+        return self.done
+
+    def _shed(self, reason):
+        logging.warning("shedding {} request: {}".format(self.name, reason))
+        self.output = 'request shed: %s' % reason
+        self._done.set()
+
+
+class Dispatcher(object):
+    '''Serializes requests from many callers onto one session.
+
+    The session must be connected before requests are processed and
+    must not be used directly while the dispatcher is running.
+
+    :param session: the WSMA session (e.g. :class:`HTTP <wsma.HTTP>`)
+    :param depth: max number of queued requests (int)
+    :param shed_depth: from this queue length on, BULK requests are
+                       rejected, default is half of depth, at least 1 (int)
+    '''
+
+    def __init__(self, session, depth=100, shed_depth=None):
+        super(Dispatcher, self).__init__()
+        if depth < 1:
+            raise ValueError("depth must be at least 1")
+        self.session = session
+        self.depth = depth
+        if shed_depth is None:
+            shed_depth = depth // 2
+        if shed_depth > depth:
+            raise ValueError("shed_depth may not exceed depth")
+        # BULK requests must at least get through on an empty queue
+        self.shed_depth = max(1, shed_depth)
+
+        # per priority class: caller -> deque of requests
+        self._queues = dict((p, OrderedDict())
+                            for p in (INTERACTIVE, NORMAL, BULK))
+        self._length = 0
+        # submission order, to find the newest request
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._running = False
+        self._stopped = False
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def __len__(self):
+        return self._length
+
+    def _evict(self, priority):
+        '''Drop the newest request of the lowest class below priority.
+        '''
+        for p in sorted(self._queues, reverse=True):
+            if p <= priority:
+                break
+            callers = self._queues[p]
+            if not callers:
+                continue
+            # callers rotate round-robin, compare their last requests
+            caller = max(callers, key=lambda c: callers[c][-1]._seq)
+            victim = callers[caller].pop()
+            if not callers[caller]:
+                del callers[caller]
+            self._length -= 1
+            victim._shed('evicted by higher priority request')
+            return True
+        return False
+
+    def submit(self, name, args=(), kwargs=None, priority=NORMAL,
+               caller=None):
+        '''Queue a call of the named session method.
+
+        :param name: session method, e.g. 'execCLI' or 'config' (str)
+        :param args: positional arguments for the method (tuple)
+        :param kwargs: keyword arguments for the method (dict)
+        :param priority: INTERACTIVE, NORMAL or BULK
+        :param caller: identifies the caller for fair scheduling,
+                       default is the submitting thread
+        :rtype: Request
+        '''
+        if priority not in self._queues:
+            raise ValueError("unknown priority %s" % priority)
+        if caller is None:
+            caller = threading.current_thread()
+        request = Request(name, args, kwargs or dict(), priority, caller)
+        with self._cond:
+            if self._stopped:
+                request._shed('dispatcher stopped')
+                return request
+            request._seq = next(self._seq)
+            if priority == BULK and self._length >= self.shed_depth:
+                request._shed('queue above shed depth')
+                return request
+            if self._length >= self.depth and not self._evict(priority):
+                request._shed('queue full')
+                return request
+            callers = self._queues[priority]
+            callers.setdefault(caller, deque()).append(request)
+            self._length += 1
+            self._cond.notify()
+        return request
+
+    def execCLI(self, command, format_spec=None, priority=NORMAL,
+                caller=None):
+        '''Queue an exec command, see :meth:`Base.execCLI`.
+        :rtype: Request
+        '''
+        return self.submit('execCLI', (command,),
+                           dict(format_spec=format_spec),
+                           priority, caller)
+
+    def config(self, command, action_on_fail="stop", priority=NORMAL,
+               caller=None):
+        '''Queue a config block, see :meth:`Base.config`.
+        :rtype: Request
+        '''
+        return self.submit('config', (command,),
+                           dict(action_on_fail=action_on_fail),
+                           priority, caller)
+
+    def _next(self):
+        '''Take the next request: highest class first, and within a
+        class the caller which has waited longest.
+        '''
+        for p in sorted(self._queues):
+            callers = self._queues[p]
+            if not callers:
+                continue
+            caller, requests = callers.popitem(last=False)
+            request = requests.popleft()
+            # back to the end of the line if there is more
+            if requests:
+                callers[caller] = requests
+            self._length -= 1
+            return request
+        return None
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._running and self._length == 0:
+                    self._cond.wait()
+                if not self._running:
+                    break
+                request = self._next()
+
+            try:
+                method = getattr(self.session, request.name)
+                request.ok = method(*request.args, **request.kwargs)
+            except Exception as e:
+                logging.error("{} failed: {}".format(request.name, e))
+                request.error = e
+            request.success = self.session.success
+            request.output = self.session.output
+            request.data = self.session.data
+            request._done.set()
+
+    def start(self):
+        '''Start processing requests.
+        '''
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+            self._stopped = False
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        '''Stop processing, the request in progress is finished and all
+        queued requests are shed, as are requests submitted until the
+        dispatcher is started again.
+        '''
+        with self._cond:
+            self._running = False
+            self._stopped = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        with self._cond:
+            while self._length > 0:
+                self._next()._shed('dispatcher stopped')
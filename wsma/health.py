@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+
+"""
+Per-host health tracking with a circuit breaker.
+
+Sessions given a :class:`HealthTracker` report connect, authentication,
+timeout and overload failures to it. After threshold consecutive
+failures the circuit of the host opens and requests fail fast with the
+cached error instead of waiting for the device. Once the cooldown has
+passed, a single probe (the next connect or a ping) is let through: if
+it succeeds the circuit closes again, otherwise it stays open for
+another cooldown.
+
+    health = HealthTracker(threshold=3, cooldown=300)
+    for host in hosts:
+        with wsma.HTTP(host, user, password, health=health) as w:
+            if w is None:
+                continue
+            w.execCLI('show version')
+
+One tracker is meant to be shared by all sessions of a fleet run.
+"""
+
+import threading
+import time
+import logging
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+
+class _Host(object):
+
+    def __init__(self):
+        self.state = CLOSED
+        self.failures = 0
+        self.error = None
+        self.since = 0.0
+
+
+class HealthTracker(object):
+    '''Tracks failures per host and fails fast for unhealthy hosts.
+
+    :param threshold: consecutive failures which open the circuit (int)
+    :param cooldown: seconds until an open circuit is probed (float)
+    '''
+
+    def __init__(self, threshold=3, cooldown=60):
+        super(HealthTracker, self).__init__()
+        if threshold < 1:
+            raise ValueError("threshold must be at least 1")
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._hosts = dict()
+        self._lock = threading.Lock()
+
+    def check(self, host):
+        '''Check whether a request to host may proceed. Returns
+
+        - CLOSED: the host is healthy, go ahead
+        - OPEN: the host is unhealthy, fail fast
+        - HALF_OPEN: the cooldown is over and the caller is the probe,
+          go ahead and report the outcome
+
+        :param host: host name or IP (str)
+        :rtype: str
+        '''
+        with self._lock:
+            h = self._hosts.get(host)
+            if h is None or h.state == CLOSED:
+                return CLOSED
+            # also retry if a probe never reported back
+            if time.time() - h.since < self.cooldown:
+                return OPEN
+            h.state = HALF_OPEN
+            h.since = time.time()
+            logging.info("probing {}".format(host))
+            return HALF_OPEN
+
+    def state(self, host):
+        '''Current state of the host's circuit.
+        :rtype: str
+        '''
+        with self._lock:
+            h = self._hosts.get(host)
+            return CLOSED if h is None else h.state
+
+    def error(self, host):
+        '''The last error recorded for host or None.
+        :rtype: str
+        '''
+        with self._lock:
+            h = self._hosts.get(host)
+            return None if h is None else h.error
+
+    def success(self, host):
+        '''Record a successful exchange with host, closes its circuit.
+
+        :param host: host name or IP (str)
+        '''
+        with self._lock:
+            h = self._hosts.get(host)
+            if h is None:
+                return
+            if h.state != CLOSED:
+                logging.info("circuit for {} closed".format(host))
+            del self._hosts[host]
+
+    def failure(self, host, kind, error):
+        '''Record a failure, opens the circuit after threshold
+        consecutive failures or if a probe failed.
+
+        :param host: host name or IP (str)
+        :param kind: 'connect', 'auth', 'timeout' or 'overload' (str)
+        :param error: error message or exception
+        '''
+        with self._lock:
+            h = self._hosts.setdefault(host, _Host())
+            h.failures += 1
+            h.error = '%s: %s' % (kind, error)
+            if h.state == HALF_OPEN or h.failures >= self.threshold:
+                if h.state != OPEN:
+                    logging.warning("circuit for {} opened ({})".format(
+                        host, h.error))
+                h.state = OPEN
+                h.since = time.time()
@@ -3,9 +3,11 @@
 """ WSMA HTTP transport """
 
 from wsma.base import Base
+from wsma import tls as _tls
 import requests
-from requests.exceptions import ConnectionError
+from requests.exceptions import ConnectionError, Timeout, RequestException
 from ssl import SSLError
+from urllib3.exceptions import ReadTimeoutError
 import logging
 
 
@@ -19,17 +21,29 @@ class HTTP(Base):
     :param port: which port to connec to? (int)
     :param tls: Use HTTPS transport? (bool)
     :param verify: SSL verification (bool)
+    :param tls_resume: Resume TLS sessions across connections (bool)
+    :param pool_maxsize: max number of kept-alive connections (int)
+    :param stream: Parse responses while they are received (bool)
     :param \*\*kwargs: Optional arguments that ``.Base`` takes.
     '''
 
+    CHUNK_SIZE = 65536
+
     def __init__(self, host, username, password, port=443,
-                 tls=True, verify=True, **kwargs):
+                 tls=True, verify=True, tls_resume=True, pool_maxsize=1,
+                 stream=False, **kwargs):
         super(HTTP, self).__init__(host, username, password, port, **kwargs)
         fmt = dict(prot='https' if tls else 'http',
                    host=self.host, port=self.port)
         # in Python3, should use .format_map(fmt)
         self.url = "{prot}://{host}:{port}/wsma".format(**fmt)
         self.verify = verify if tls else False
+        self.tls = tls
+        self.tls_resume = tls_resume
+        self.pool_maxsize = pool_maxsize
+        self.stream = stream
+        # number of requests sent, see tlsStats
+        self._requests = 0
 
     def connect(self):
         '''Connect to the WSMA service using HTTP(S)
@@ -37,12 +51,22 @@ class HTTP(Base):
         super(HTTP, self).connect()
         self._session = requests.Session()
         self._session.auth = (self.username, self.password)
+        # one host per session, keep its connections alive
+        if self.tls and self.tls_resume:
+            adapter = _tls.ResumingAdapter(verify=self.verify,
+                                           pool_connections=1,
+                                           pool_maxsize=self.pool_maxsize)
+        else:
+            adapter = requests.adapters.HTTPAdapter(
+                pool_connections=1, pool_maxsize=self.pool_maxsize)
+        self._session.mount(self.url, adapter)
         if not self.verify:
             requests.packages.urllib3.disable_warnings()
 
     def disconnect(self):
         '''Disconnect the session
         '''
+        self._flushOnDisconnect()
         self._session.close()
         super(HTTP, self).disconnect()
 
@@ -56,22 +80,87 @@ class HTTP(Base):
         if not self.success:
             return False
 
+        # parse pool and recorder need the complete response text
+        stream = (self.stream and self.parser is None and
+                  self.recorder is None)
+
+        self._requests += 1
         try:
             r = self._session.post(url=self.url, data=template_data,
                                    verify=self.verify,
-                                   timeout=self.timeout)
+                                   timeout=self.timeout,
+                                   stream=stream)
+        except Timeout as e:
+            logging.error("Timeout {}".format(e))
+            self._reportHealth('timeout', e)
+            self.output = e
+            self.success = False
+            return False
         except (ConnectionError, SSLError) as e:
             logging.error("Connection Error {}".format(e))
+            self._reportHealth('connect', e)
             self.output = e
+            self.success = False
             return False
 
         logging.info("status %s", str(r.status_code))
+        if r.status_code in (401, 403):
+            self._reportHealth('auth', r.status_code)
+        elif r.status_code >= 500:
+            self._reportHealth('overload', r.status_code)
+        elif not (stream and r.ok):
+            # a streamed body is reported once it has been received
+            self._reportHealth()
         if not r.ok:
             self.output = r.text
+            self.success = False
             return False
 
+        if stream:
+            return self._processStream(r)
+
         # this needs to be response.content,
         # otherwise generates unicode string error
         xml_text = r.content.decode("utf-8")
         logging.debug("DATA: %s", xml_text)
         return self._process(xml_text)
+
+    def _processStream(self, r):
+        '''Parse the body of the given streamed response while it is
+        received and process the result.
+
+        :param r: response object of a request with stream=True
+        :rtype: bool
+        '''
+        try:
+            self.data = self.parseXMLStream(
+                r.iter_content(chunk_size=self.CHUNK_SIZE))
+        except RequestException as e:
+            # requests raises read timeouts of the body as ConnectionError
+            if isinstance(e, Timeout) or (
+                    e.args and isinstance(e.args[0], ReadTimeoutError)):
+                logging.error("Timeout {}".format(e))
+                self._reportHealth('timeout', e)
+            else:
+                logging.error("Connection Error {}".format(e))
+                self._reportHealth('connect', e)
+            self.output = e
+            self.success = False
+            return False
+        finally:
+            r.close()
+        self._reportHealth()
+        logging.debug("DATA: streamed %s", self.data)
+        return self._update(*self.evaluate(self.data))
+
+    @property
+    def tlsStats(self):
+        '''Connection statistics: the number of requests sent by this
+        session, and the number of full TLS handshakes and resumed
+        TLS sessions with this host (across all sessions). Requests not
+        accounted for by handshakes were sent on kept-alive connections.
+        :rtype dict:
+        '''
+        result = _tls.stats(self.host, self.port)
+        result['requests'] = self._requests
+        return result
@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+
+"""
+Offload response parsing to a pool of worker processes.
+
+Parsing and evaluating the XML responses is pure CPU work. When many
+devices are polled concurrently from threads of the same process, this
+work serializes on the GIL and the network threads stall behind it. A
+:class:`ParsePool` moves it into separate processes:
+
+    pool = ParsePool(processes=4, max_pending=64)
+    with wsma.HTTP(host, user, password, parser=pool) as w:
+        w.execCLI('show version')
+
+Only the raw response text is sent to a worker, and only a compact
+:class:`ParseResult` (success, output, ODM tree or error) is sent back.
+The session's data then only holds a minimal response dict rebuilt
+from it.
+"""
+
+from collections import namedtuple
+from wsma.base import Base
+import multiprocessing
+import threading
+import logging
+
+
+class ParseResult(namedtuple('ParseResult',
+                             'ok success output error tree namespace')):
+    '''Compact result of parsing and evaluating one response, this is
+    what is sent back from the worker process.
+
+    - ok: the overall result, as returned by :meth:`Base._process`
+    - success: the success flag of the response or None
+    - output: CLI output / error message of the response or None
+    - error: parse error message or None
+    - tree: the ODM tree of the response or None
+    - namespace: the namespace of the response, e.g. urn:cisco:wsma-exec
+    '''
+
+    __slots__ = ()
+
+    @property
+    def data(self):
+        '''A minimal response dict rebuilt from the result, in the
+        layout of :meth:`Base.parseXML`. It only holds the error or the
+        namespace, the success flag and the ODM tree, the CLI output is
+        in output.
+        :rtype dict:
+        '''
+        if self.error is not None:
+            return dict(error=self.error)
+        response = dict()
+        if self.namespace is not None:
+            response['@xmlns'] = self.namespace
+        if self.success is not None:
+            response['@success'] = '1' if self.success else '0'
+        if self.tree is not None:
+            response['execLog'] = dict(dialogueLog=dict(
+                received=dict(tree=self.tree)))
+        return dict(response=response)
+
+
+def parse_response(xml_text):
+    '''Parse and evaluate a response. This runs in the worker process
+    and must therefore not raise, an exception would get lost in
+    the pool.
+
+    :param xml_text: XML string as received from the device
+    :rtype: ParseResult
+    '''
+    try:
+        data = Base.parseXML(xml_text)
+        ok, success, output = Base.evaluate(data)
+    except Exception as e:
+        data = dict(error='%s' % e)
+        ok, success, output = False, None, None
+
+    response = data.get('response')
+    if not isinstance(response, dict):
+        response = dict()
+    try:
+        tree = response['execLog']['dialogueLog']['received']['tree']
+    except (KeyError, TypeError):
+        tree = None
+    return ParseResult(ok, success, output, data.get('error'), tree,
+                       response.get('@xmlns'))
+
+
+class ParsePool(object):
+    '''A pool of worker processes parsing responses.
+
+    At most max_pending responses are in flight at any given time,
+    further submissions block until a worker has finished. This keeps
+    memory bounded if the devices deliver faster than the workers can
+    parse.
+
+    :param processes: number of worker processes, default is CPU count
+    :param max_pending: max number of responses queued or in progress,
+                        default is twice the number of processes
+    '''
+
+    def __init__(self, processes=None, max_pending=None):
+        super(ParsePool, self).__init__()
+        if processes is None:
+            processes = multiprocessing.cpu_count()
+        if max_pending is None:
+            max_pending = 2 * processes
+        if max_pending < 1:
+            raise ValueError("max_pending must be at least 1")
+
+        self.max_pending = max_pending
+        self._pool = multiprocessing.Pool(processes)
+        self._pending = threading.BoundedSemaphore(max_pending)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _submit(self, xml_text, callback=None):
+        '''Queue the given response, returns the async result and a
+        function giving back its slot. The slot is given back exactly
+        once, either when the worker is done or by the caller giving up.
+        '''
+        self._pending.acquire()
+        lock = threading.Lock()
+        held = [True]
+
+        def release():
+            with lock:
+                if not held[0]:
+                    return
+                held[0] = False
+            self._pending.release()
+
+        def done(result):
+            release()
+            if callback is not None:
+                callback(result)
+
+        try:
+            result = self._pool.apply_async(parse_response, (xml_text,),
+                                            callback=done)
+        except Exception:
+            release()
+            raise
+        return result, release
+
+    def submit(self, xml_text, callback=None):
+        '''Queue the given response for parsing. Blocks if max_pending
+        responses are already in flight.
+
+        :param xml_text: XML string as received from the device
+        :param callback: called with the ParseResult when done
+        :rtype: multiprocessing.pool.AsyncResult
+        '''
+        return self._submit(xml_text, callback)[0]
+
+    def parse(self, xml_text, timeout=None):
+        '''Parse the given response in a worker and wait for the result.
+        If there is no result within timeout seconds, e.g. because the
+        worker died, a ParseResult with an error is returned.
+
+        :param xml_text: XML string as received from the device
+        :param timeout: max seconds to wait, None waits forever
+        :rtype: ParseResult
+        '''
+        result, release = self._submit(xml_text)
+        try:
+            return result.get(timeout)
+        except multiprocessing.TimeoutError:
+            logging.error("no parse result within {}s".format(timeout))
+            # don't leak the slot of a lost job
+            release()
+            error = 'parse timeout'
+            return ParseResult(False, None, None, error, None, None)
+
+    def map(self, responses):
+        '''Parse many responses, yielding the results in order. At most
+        max_pending responses are being parsed or waiting to be yielded
+        at any given time.
+
+        :param responses: iterable of XML strings
+        :rtype: generator of ParseResult
+        '''
+        pending = []
+        for xml_text in responses:
+            # a slow result at the head must not let finished ones pile up
+            if len(pending) >= self.max_pending:
+                yield pending.pop(0).get()
+            pending.append(self.submit(xml_text))
+            while pending and pending[0].ready():
+                yield pending.pop(0).get()
+        for result in pending:
+            yield result.get()
+
+    def close(self):
+        '''Wait for outstanding work and stop the worker processes.
+        '''
+        logging.debug("closing parse pool")
+        self._pool.close()
+        self._pool.join()
@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+
+"""
+Parsers for the text output of common show commands.
+
+ODM format specs are not available on every platform and the name of
+the built-in spec differs between releases. The parsers here turn the
+plain CLI output into a list of records (dicts) on the client side:
+
+    w.execCLI('show ip interface brief')
+    for intf in parsers.parse('show ip interface brief', w.output):
+        print(intf['interface'], intf['status'])
+
+Commands may be abbreviated ('sh ip int br') and piped output filters
+are ignored for the lookup. The patterns are compiled once at import
+time and the command to parser lookup is cached.
+"""
+
+import re
+import threading
+
+_registry = dict()
+_cache = dict()
+_lock = threading.Lock()
+_CACHE_SIZE = 1024
+
+
+def register(command):
+    '''Decorator registering a parser function for the given (full)
+    show command. The function gets the output text and returns a
+    list of records.
+
+    :param command: the show command, not abbreviated (str)
+    '''
+    def decorator(func):
+        with _lock:
+            _registry[tuple(command.split())] = func
+            _cache.clear()
+        return func
+    return decorator
+
+
+def lookup(command):
+    '''Return the parser for the given, possibly abbreviated, command
+    or None if there is none.
+
+    :param command: the show command (str)
+    :rtype: function
+    '''
+    try:
+        return _cache[command]
+    except KeyError:
+        pass
+
+    words = command.split('|')[0].split()
+    found = None
+    for key, func in _registry.items():
+        if len(key) != len(words):
+            continue
+        if all(k.startswith(w.lower()) for k, w in zip(key, words)):
+            found = func
+            break
+
+    with _lock:
+        if len(_cache) >= _CACHE_SIZE:
+            _cache.clear()
+        _cache[command] = found
+    return found
+
+
+def parse(command, output):
+    '''Parse the output of the given command. Returns None if there
+    is no parser for the command.
+
+    :param command: the show command (str)
+    :param output: the CLI output of the command (str)
+    :rtype: list
+    '''
+    parser = lookup(command)
+    if parser is None or output is None:
+        return None
+    return parser(output)
+
+
+def parse_many(results):
+    '''Parse many outputs, e.g. collected from a fleet of devices.
+
+    :param results: iterable of (command, output) tuples
+    :rtype: generator of lists, None for unknown commands
+    '''
+    for command, output in results:
+        yield parse(command, output)
+
+
+_IP_INTERFACE_BRIEF = re.compile(
+    r'^(?P<interface>\S+)\s+(?P<ip_address>\S+)\s+(?P<ok>YES|NO)\s+'
+    r'(?P<method>\S+)\s+'
+    r'(?P<status>up|down|administratively down|deleted)\s+'
+    r'(?P<protocol>up|down)\s*$')
+
+
+@register('show ip interface brief')
+def ip_interface_brief(output):
+    '''Records with interface, ip_address, ok, method, status, protocol.
+    '''
+    records = []
+    for line in output.splitlines():
+        m = _IP_INTERFACE_BRIEF.match(line)
+        if m is not None:
+            records.append(m.groupdict())
+    return records
+
+
+_ROUTE = re.compile(
+    r'^(?P<code>[A-Za-z][a-z]?\*?(?: ?[A-Z][A-Z0-9]?)?)\s+'
+    r'(?P<prefix>\d+\.\d+\.\d+\.\d+)(?:/(?P<length>\d+))?'
+    r'(?:\s+(?P<rest>.*))?$')
+_ROUTE_VIA = re.compile(
+    r'^\[(?P<distance>\d+)/(?P<metric>\d+)\]\s+via\s+(?P<next_hop>[\d.]+)'
+    r'(?P<more>.*)$')
+_ROUTE_CONNECTED = re.compile(r'^is directly connected,\s*(?P<interface>\S+)')
+_ROUTE_CONTINUED = re.compile(
+    r'^\s+(?P<rest>(?:\[\d+/\d+\]\s+via\s|is directly connected,).*)$')
+_ROUTE_SUBNETTED = re.compile(
+    r'^\s+\d+\.\d+\.\d+\.\d+/(?P<length>\d+) is subnetted')
+
+
+def _route_path(rest):
+    '''Parse the path part of a route line into a dict or None.
+    '''
+    m = _ROUTE_CONNECTED.match(rest)
+    if m is not None:
+        return dict(next_hop=None, interface=m.group('interface'),
+                    distance=None, metric=None, age=None)
+    m = _ROUTE_VIA.match(rest)
+    if m is None:
+        return None
+    path = dict(next_hop=m.group('next_hop'), interface=None,
+                distance=int(m.group('distance')),
+                metric=int(m.group('metric')), age=None)
+    for field in [f.strip() for f in m.group('more').split(',')]:
+        if not field:
+            continue
+        if ':' in field or field[0].isdigit():
+            path['age'] = field
+        else:
+            path['interface'] = field
+    return path
+
+
+@register('show ip route')
+def ip_route(output):
+    '''Records with code, prefix (in CIDR notation) and a list of paths,
+    each with next_hop, interface, distance, metric and age.
+    '''
+    records = []
+    length = None
+    for line in output.splitlines():
+        m = _ROUTE_SUBNETTED.match(line)
+        if m is not None:
+            length = m.group('length')
+            continue
+        m = _ROUTE_CONTINUED.match(line)
+        if m is not None and records:
+            path = _route_path(m.group('rest'))
+            if path is not None:
+                records[-1]['paths'].append(path)
+            continue
+        m = _ROUTE.match(line)
+        if m is None:
+            continue
+        rest = (m.group('rest') or '').strip()
+        if rest:
+            path = _route_path(rest)
+            if path is None:
+                continue
+            paths = [path]
+        else:
+            # long prefixes wrap, the path follows on the next line
+            paths = []
+        prefix_length = m.group('length') or length or '32'
+        records.append(dict(code=m.group('code'),
+                            prefix='%s/%s' % (m.group('prefix'),
+                                              prefix_length),
+                            paths=paths))
+    # drop wrapped prefixes whose path line never came
+    return [r for r in records if r['paths']]
+
+
+_INVENTORY_NAME = re.compile(
+    r'^NAME:\s*"(?P<name>[^"]*)",\s*DESCR:\s*"(?P<descr>[^"]*)"')
+_INVENTORY_PID = re.compile(
+    r'^PID:\s*(?P<pid>[^,]*?)\s*,\s*VID:\s*(?P<vid>[^,]*?)\s*,'
+    r'\s*SN:\s*(?P<sn>\S*)')
+
+
+@register('show inventory')
+def inventory(output):
+    '''Records with name, descr, pid, vid and sn.
+    '''
+    records = []
+    for line in output.splitlines():
+        m = _INVENTORY_NAME.match(line)
+        if m is not None:
+            records.append(dict(m.groupdict(), pid=None, vid=None, sn=None))
+            continue
+        m = _INVENTORY_PID.match(line)
+        if m is not None and records:
+            records[-1].update(m.groupdict())
+    return records
+
+
+_VERSION = [
+    re.compile(r'^Cisco IOS.*Version (?P<version>[^,\s]+)'),
+    re.compile(r'^(?P<hostname>\S+) uptime is (?P<uptime>.+)$'),
+    re.compile(r'^System image file is "(?P<image>[^"]*)"'),
+    re.compile(r'^[Cc]isco (?P<platform>\S+) .*processor'),
+    re.compile(r'^[Cc]isco (?P<platform>\S+) .*with \S+ bytes of memory'),
+    re.compile(r'^Processor board ID (?P<serial>\S+)'),
+    re.compile(r'^Configuration register is (?P<config_register>\S+)'),
+]
+
+
+@register('show version')
+def version(output):
+    '''A single record with version, hostname, uptime, image, platform,
+    serial and config_register. Fields not found are None.
+    '''
+    record = dict.fromkeys(['version', 'hostname', 'uptime', 'image',
+                            'platform', 'serial', 'config_register'])
+    for line in output.splitlines():
+        for pattern in _VERSION:
+            m = pattern.match(line)
+            if m is not None:
+                for key, value in m.groupdict().items():
+                    if record[key] is None:
+                        record[key] = value
+    return [record]
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+
+""" WSMA replay transport """
+
+from wsma.base import Base
+from wsma.archive import Archive
+import logging
+
+
+class Replay(Base):
+    '''This is the replay version of transport. Instead of talking to a
+    device it serves responses from an :class:`Archive <wsma.archive.Archive>`
+    which has been recorded before.
+    It returns a :class:`Replay <Replay>` object
+
+    :param host: FQDN or IP the responses were recorded for (str)
+    :param archive: Archive instance or path to the archive (str)
+    :param username: username (str), not used
+    :param password: password for user (str), not used
+    :param \*\*kwargs: Optional arguments that ``.Base`` takes.
+    '''
+
+    def __init__(self, host, archive, username='', password='', port=None,
+                 **kwargs):
+        super(Replay, self).__init__(host, username, password, port, **kwargs)
+        if not isinstance(archive, Archive):
+            archive = Archive(archive)
+        self.archive = archive
+        self.url = "replay://{host}".format(host=self.host)
+
+    def connect(self):
+        '''Connect to the archive
+        '''
+        super(Replay, self).connect()
+        self._session = self.archive
+
+    def disconnect(self):
+        '''Disconnect from the archive, the archive itself stays open
+        '''
+        self._flushOnDisconnect()
+        super(Replay, self).disconnect()
+
+    def communicate(self, template_data):
+        '''Serve the recorded response for the current request.
+
+        :param template_data: xml data to be send, not used
+        :rtype: bool
+        '''
+        super(Replay, self).communicate(template_data)
+        if not self.success:
+            return False
+
+        record = self._session.lookup(self.host, self._request)
+        if record is None:
+            logging.error("no recorded response for {}".format(
+                self._request))
+            self.output = 'no recorded response!'
+            self.success = False
+            return False
+
+        logging.debug("DATA: %s", record['response'])
+        return self._process(record['response'])
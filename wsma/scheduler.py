@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+
+"""
+Periodic polling of exec commands across many devices.
+
+Jobs are added as (sessions, command, interval). Each device gets a
+random initial offset within the interval and every run is jittered so
+that devices are not all polled at the same time. Requests to a device
+are spaced according to the per-device rate, sessions are kept open
+between polls and only results which differ from the previous poll of
+the same command are passed to the callback:
+
+    def changed(session, command):
+        print(session.host, command, session.output)
+
+    s = Scheduler(changed, workers=8, rate=0.5)
+    s.add([wsma.HTTP(h, user, password) for h in hosts],
+          'show ip interface brief', 300)
+    s.start()
+"""
+
+from __future__ import division
+import hashlib
+import heapq
+import itertools
+import json
+import random
+import threading
+import time
+import logging
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+
+class _Job(object):
+
+    def __init__(self, command, interval, format_spec):
+        self.command = command
+        self.interval = interval
+        self.format_spec = format_spec
+
+
+class _Device(object):
+
+    def __init__(self, session):
+        self.session = session
+        self.connected = False
+        self.busy = False
+        # earliest time the next request may be sent
+        self.next_allowed = 0.0
+        # digest of the last result per (command, format_spec)
+        self.digests = dict()
+
+
+class Scheduler(object):
+    '''Runs exec commands periodically against sets of devices.
+
+    :param callback: called as callback(session, command) with the
+                     session still holding the result of a changed
+                     poll (success, output, odmFormatResult)
+    :param workers: number of worker threads (int)
+    :param rate: max number of requests per second per device (float)
+    :param jitter: max deviation of a run from its slot as a fraction
+                   of the interval (float)
+    '''
+
+    def __init__(self, callback, workers=4, rate=1.0, jitter=0.1):
+        super(Scheduler, self).__init__()
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.callback = callback
+        self.workers = workers
+        self.rate = rate
+        self.jitter = jitter
+
+        self._devices = dict()
+        self._heap = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._work = queue.Queue()
+        self._threads = []
+        self._running = False
+
+    def add(self, sessions, command, interval, format_spec=None):
+        '''Poll command on every given session each interval seconds.
+        Sessions are identified by their host, a session for a host
+        which is already known is ignored in favour of the known one.
+
+        :param sessions: iterable of (unconnected) WSMA sessions
+        :param command: exec command to run (str)
+        :param interval: poll interval in seconds (float)
+        :param format_spec: optional ODM format spec (str)
+        '''
+        if interval <= 0:
+            raise ValueError("interval must be positive")
+        job = _Job(command, interval, format_spec)
+        now = time.time()
+        with self._cond:
+            for session in sessions:
+                if session.host not in self._devices:
+                    self._devices[session.host] = _Device(session)
+                # spread the first runs over the whole interval
+                slot = now + random.uniform(0, interval)
+                self._push(slot, slot, job, session.host)
+            self._cond.notify()
+
+    def _push(self, due, slot, job, host):
+        # slot is the unjittered time the run belongs to
+        heapq.heappush(self._heap, (due, next(self._seq), slot, job, host))
+
+    def _dispatch(self):
+        '''Hand due jobs to the workers, observing the device rate.
+        '''
+        with self._cond:
+            while self._running:
+                now = time.time()
+                if not self._heap:
+                    self._cond.wait()
+                    continue
+                due, _, slot, job, host = self._heap[0]
+                if due > now:
+                    self._cond.wait(due - now)
+                    continue
+                heapq.heappop(self._heap)
+                device = self._devices[host]
+                if device.busy or device.next_allowed > now:
+                    later = max(device.next_allowed, now + 1 / self.rate)
+                    self._push(later, slot, job, host)
+                    continue
+                device.busy = True
+                device.next_allowed = now + 1 / self.rate
+                self._work.put((slot, job, device))
+
+    def _poll(self, job, device):
+        '''Run job on device, reconnecting if needed. Returns True
+        if the result differs from the previous one. A failed exec is
+        not a result, the device is disconnected and reconnected on the
+        next poll.
+        '''
+        session = device.session
+        try:
+            if not device.connected:
+                session.connect()
+                # connect may fail without raising, e.g. SSH auth
+                # failures or an open circuit leave no session
+                device.connected = session._session is not None
+            ok = session.execCLI(job.command, format_spec=job.format_spec)
+            if not ok or session._session is None:
+                raise RuntimeError(session.output or 'exec failed')
+        except Exception as e:
+            logging.error("polling {} failed: {}".format(session.host, e))
+            self._disconnect(device)
+            return False
+
+        if job.format_spec is not None:
+            result = json.dumps(session.odmFormatResult, sort_keys=True)
+        else:
+            result = session.output
+        digest = hashlib.sha1(result.encode('utf-8')).hexdigest()
+        key = (job.command, job.format_spec)
+        if device.digests.get(key) == digest:
+            return False
+        device.digests[key] = digest
+        return True
+
+    def _disconnect(self, device):
+        '''Disconnect the session of device, it is reconnected on the
+        next poll.
+        '''
+        if device.connected:
+            try:
+                device.session.disconnect()
+            except Exception:
+                pass
+        device.connected = False
+
+    def _worker(self):
+        while True:
+            item = self._work.get()
+            if item is None:
+                break
+            slot, job, device = item
+            try:
+                if self._poll(job, device):
+                    self.callback(device.session, job.command)
+            except Exception as e:
+                logging.error("callback for {} failed: {}".format(
+                    device.session.host, e))
+            with self._cond:
+                device.busy = False
+                # keep the cadence of the job, not of the actual runs
+                slot = max(slot + job.interval, time.time())
+                due = slot + (random.uniform(-self.jitter, self.jitter) *
+                              job.interval)
+                self._push(due, slot, job, device.session.host)
+                self._cond.notify()
+
+    def start(self):
+        '''Start the dispatcher and the worker threads.
+        '''
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        self._threads = [threading.Thread(target=self._dispatch)]
+        self._threads.extend(threading.Thread(target=self._worker)
+                             for _ in range(self.workers))
+        for t in self._threads:
+            t.daemon = True
+            t.start()
+
+    def stop(self):
+        '''Stop polling, wait for running polls to finish and
+        disconnect all sessions.
+        '''
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        for _ in range(self.workers):
+            self._work.put(None)
+        for t in self._threads:
+            t.join()
+        self._threads = []
+        for device in self._devices.values():
+            if device.connected:
+                device.session.disconnect()
+                device.connected = False
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+
+"""
+Deduplicated, compressed store for collected device outputs.
+
+Outputs are stored once per unique content, addressed by their SHA-1
+digest and zlib compressed. Per device, a timeline records which
+output each command had from when on, as references to the stored
+blobs. A poll which returns the same output as the previous one only
+costs a digest computation, nothing is written:
+
+    store = SnapshotStore('/var/lib/wsma/snapshots')
+    with wsma.HTTP(host, user, password) as w:
+        if w.execCLI('show running-config'):
+            store.add(w)
+
+    print(''.join(store.diff(host, 'show running-config')))
+
+The layout of the store directory is
+
+- blobs/<2 hex digits>/<digest>: the compressed outputs
+- timelines/<host>.jsonl: one JSON line (time, command, digest) per
+  change of a command's output on the host
+"""
+
+import difflib
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+import zlib
+import logging
+
+try:
+    from urllib.parse import quote
+except ImportError:
+    from urllib import quote
+
+
+class SnapshotStore(object):
+    '''A content addressed store of device outputs with per device
+    timelines.
+
+    :param path: directory of the store, created if needed (str)
+    :param level: zlib compression level (int)
+    '''
+
+    def __init__(self, path, level=9):
+        super(SnapshotStore, self).__init__()
+        self.path = path
+        self.level = level
+        self._lock = threading.Lock()
+        # digest of the latest output per (host, command)
+        self._latest = dict()
+        # hosts whose timeline has been loaded into _latest
+        self._loaded = set()
+        for d in ('blobs', 'timelines'):
+            if not os.path.isdir(os.path.join(path, d)):
+                os.makedirs(os.path.join(path, d))
+
+    def _blob(self, digest):
+        return os.path.join(self.path, 'blobs', digest[:2], digest)
+
+    def _timeline(self, host):
+        return os.path.join(self.path, 'timelines',
+                            quote(host, safe='') + '.jsonl')
+
+    def _load(self, host):
+        if host in self._loaded:
+            return
+        for entry in self.timeline(host):
+            self._latest[(host, entry['command'])] = entry['digest']
+        self._loaded.add(host)
+
+    def _write_blob(self, digest, blob):
+        path = self._blob(digest)
+        if os.path.exists(path):
+            return
+        directory = os.path.dirname(path)
+        if not os.path.isdir(directory):
+            try:
+                os.makedirs(directory)
+            except OSError:
+                # created concurrently
+                pass
+        # write to a temp file first, readers never see partial blobs
+        fd, tmp = tempfile.mkstemp(dir=directory)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(blob)
+        os.rename(tmp, path)
+
+    def put(self, host, command, output, timestamp=None):
+        '''Store the output of command on host. Returns the digest of
+        the output and whether it changed since the previous snapshot.
+
+        :param host: host name or IP (str)
+        :param command: the command which produced the output (str)
+        :param output: the output (str)
+        :param timestamp: time of the snapshot, default is now (float)
+        :rtype: tuple (digest, changed)
+        '''
+        data = output.encode('utf-8')
+        digest = hashlib.sha1(data).hexdigest()
+        with self._lock:
+            self._load(host)
+            if self._latest.get((host, command)) == digest:
+                return digest, False
+
+        # blobs are content addressed and written atomically, so other
+        # devices don't have to wait for the compression and the write
+        self._write_blob(digest, zlib.compress(data, self.level))
+
+        entry = dict(time=time.time() if timestamp is None else timestamp,
+                     command=command, digest=digest)
+        with self._lock:
+            # the same output may have been stored meanwhile
+            if self._latest.get((host, command)) == digest:
+                return digest, False
+            with open(self._timeline(host), 'a') as f:
+                f.write(json.dumps(entry) + '\n')
+            self._latest[(host, command)] = digest
+        logging.debug("new snapshot of '{}' on {}: {}".format(command, host,
+                                                              digest))
+        return digest, True
+
+    def add(self, session, command=None):
+        '''Store the output of the last exec command of a session. Does
+        nothing if the command failed (execCLI returned False), if the
+        last request wasn't an exec command or if it used a format_spec
+        (the output is empty then, the results are in data).
+
+        :param session: a WSMA session after execCLI
+        :param command: the command, default is the session's last one
+        :rtype: tuple (digest, changed) or None
+        '''
+        if not session.success:
+            return None
+        # success alone stays True e.g. if the response didn't parse
+        try:
+            response = session.data['response']
+            ok = (response['@xmlns'] == 'urn:cisco:wsma-exec' and
+                  bool(int(response['@success'])))
+        except (TypeError, KeyError, ValueError):
+            ok = False
+        request = session._request
+        if not ok or request is None or request[0] != 'exec' or request[2]:
+            logging.debug("not storing output of {} on {}".format(
+                request, session.host))
+            return None
+        if command is None:
+            command = request[1]
+        return self.put(session.host, command, session.output)
+
+    def get(self, digest):
+        '''Return the output with the given digest.
+
+        :param digest: SHA-1 hex digest (str)
+        :rtype: str
+        '''
+        with open(self._blob(digest), 'rb') as f:
+            return zlib.decompress(f.read()).decode('utf-8')
+
+    def timeline(self, host, command=None):
+        '''Return the timeline of host, optionally only for the given
+        command, oldest first. Each entry is a dict with time, command
+        and digest.
+
+        :param host: host name or IP (str)
+        :param command: only entries of this command (str)
+        :rtype: list
+        '''
+        path = self._timeline(host)
+        if not os.path.exists(path):
+            return []
+        with open(path) as f:
+            entries = [json.loads(line) for line in f if line.strip()]
+        if command is not None:
+            entries = [e for e in entries if e['command'] == command]
+        return entries
+
+    def diff(self, host, command, old=-2, new=-1, context=3):
+        '''Unified diff between two snapshots of command on host, given
+        as indexes into its timeline (default: the two latest). Only the
+        two outputs involved are read and decompressed.
+
+        :param host: host name or IP (str)
+        :param command: the command (str)
+        :param old: timeline index of the older snapshot (int)
+        :param new: timeline index of the newer snapshot (int)
+        :param context: number of context lines (int)
+        :rtype: list of str
+        '''
+        entries = self.timeline(host, command)
+        try:
+            a, b = entries[old], entries[new]
+        except IndexError:
+            return []
+        return self.diffDigests(a['digest'], b['digest'], context,
+                                fromfile='%s@%s' % (command, a['time']),
+                                tofile='%s@%s' % (command, b['time']))
+
+    def diffDigests(self, old, new, context=3, fromfile='', tofile=''):
+        '''Unified diff between the outputs with the given digests.
+        Identical digests are identical outputs, nothing is read then.
+
+        :param old: digest of the older output (str)
+        :param new: digest of the newer output (str)
+        :param context: number of context lines (int)
+        :rtype: list of str
+        '''
+        if old == new:
+            return []
+        return list(difflib.unified_diff(
+            self.get(old).splitlines(True), self.get(new).splitlines(True),
+            fromfile=fromfile, tofile=tofile, n=context))
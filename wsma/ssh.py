@@ -3,6 +3,7 @@
 """ WSMA SSH transport """
 
 from wsma.base import Base
+from wsma.health import OPEN
 import paramiko
 import socket
 import logging
@@ -35,50 +36,82 @@ class SSH(Base):
         self._cmd_channel.sendall(self.EOM)
 
     def _recv(self):
-        bytes = u""
-        while len(bytes) < len(self.EOM):
-            x = self._cmd_channel.recv(self.BUFSIZ).decode('utf-8')
-            if x == "":
-                return bytes
-            bytes += x
-        idx = bytes.find(self.EOM)
-        if idx > -1:
-            return bytes[:idx]
+        '''Receive up to the next EOM. Returns None if the channel is
+        closed before the EOM arrived.
+        '''
+        eom = self.EOM.encode('utf-8')
+        buf = b""
+        idx = -1
+        while idx == -1:
+            x = self._cmd_channel.recv(self.BUFSIZ)
+            if not x:
+                return None
+            buf += x
+            idx = buf.find(eom)
+        return buf[:idx].decode('utf-8')
 
     def connect(self):
         '''Connect to the WSMA service using SSH
         '''
         super(SSH, self).connect()
 
-        # Socket connection to remote host
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.connect((self.host, self.port))
+        # don't even try if the host is known to be unhealthy
+        if self.health is not None and self.health.check(self.host) == OPEN:
+            logging.error("Host unhealthy, not connecting.")
+            return
+
+        # Socket connection to remote host, bounded by the timeout
+        try:
+            sock = socket.create_connection((self.host, self.port),
+                                            self.timeout)
+        except (socket.error, socket.timeout) as e:
+            self._reportHealth('connect', e)
+            raise
         self._session = paramiko.Transport(sock)
         try:
             self._session.connect(username=self.username,
                                   password=self.password)
-        except paramiko.AuthenticationException:
+        except paramiko.AuthenticationException as e:
             logging.error("SSH Authentication failed.")
+            self._reportHealth('auth', e)
             self.disconnect()
+            return
+        except (paramiko.SSHException, socket.error) as e:
+            logging.error("SSH connection failed.")
+            self._reportHealth('connect', e)
+            self.disconnect()
+            return
 
         # Start a wsma channel
         self._cmd_channel = self._session.open_session()
+        self._cmd_channel.settimeout(self.timeout)
         self._cmd_channel.set_name("wsma")
         self._cmd_channel.invoke_subsystem('wsma')
 
         # look for the "wsma-hello" message
-        hello = self._recv()
-        idx = hello.find("wsma-hello")
-
-        if idx == -1:
+        try:
+            hello = self._recv()
+        except socket.timeout as e:
             logging.error("No wsma-hello from host")
+            self._reportHealth('timeout', e)
             self.disconnect()
+            return
+        if hello is None or hello.find("wsma-hello") == -1:
+            logging.error("No wsma-hello from host")
+            self._reportHealth('connect', 'no wsma-hello from host')
+            self.disconnect()
+            return
+        self._reportHealth()
 
     def disconnect(self):
         '''Disconnect the SSH session
         '''
-        self._cmd_channel.close()
-        self._session.close()
+        if self._cmd_channel is not None:
+            self._flushOnDisconnect()
+            self._cmd_channel.close()
+            self._cmd_channel = None
+        if self._session is not None:
+            self._session.close()
         super(SSH, self).disconnect()
 
     def communicate(self, template_data):
@@ -88,7 +121,22 @@ class SSH(Base):
         if not self.success:
             return False
 
-        self._send(template_data)
-        response = self._recv()
+        try:
+            self._send(template_data)
+            response = self._recv()
+        except socket.timeout as e:
+            logging.error("Timeout {}".format(e))
+            self._reportHealth('timeout', e)
+            self.output = e
+            self.success = False
+            return False
+        if not response:
+            # closed channel or empty answer, the host is not usable
+            logging.error("No response from host")
+            self._reportHealth('connect', 'no response from host')
+            self.output = 'no response from host'
+            self.success = False
+            return False
+        self._reportHealth()
         logging.debug("DATA: %s", response)
         return self._process(response)
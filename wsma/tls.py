@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+
+"""
+TLS session resumption for the HTTPS transport.
+
+A full TLS handshake is expensive on older route processors. The
+contexts here remember the TLS session of the last connection to each
+host and offer it when connecting again, so that a new connection, even
+one of a new :class:`HTTP <wsma.HTTP>` session, can skip the full
+handshake if the device supports resumption.
+
+The session is saved after the first read from a connection and again
+when it is closed. With TLS 1.3 the server sends the resumable session
+(ticket) only after the handshake, saving it right away would never
+allow to resume.
+
+Handshake statistics are kept per host (full handshakes vs. resumed
+sessions), see :func:`stats`.
+"""
+
+from requests.adapters import HTTPAdapter
+import ssl
+import threading
+import logging
+
+_lock = threading.Lock()
+_contexts = dict()
+_stats = dict()
+
+
+class _ResumingSocket(ssl.SSLSocket):
+    '''SSL socket saving its TLS session for resumption. With TLS 1.3
+    the resumable session (ticket) only arrives after the handshake,
+    so the session is saved after the first read and when the socket
+    is closed, not right after the handshake.
+    '''
+
+    def _save_session(self):
+        resume = getattr(self, '_resume', None)
+        if resume is None:
+            return
+        session = self.session
+        if session is not None:
+            resume[0]._save(resume[1], session)
+
+    def read(self, *args, **kwargs):
+        data = super(_ResumingSocket, self).read(*args, **kwargs)
+        if not getattr(self, '_session_saved', False):
+            self._session_saved = True
+            self._save_session()
+        return data
+
+    def close(self):
+        try:
+            self._save_session()
+        except (ValueError, OSError):
+            pass
+        super(_ResumingSocket, self).close()
+
+
+class _ResumingContext(ssl.SSLContext):
+    '''SSL context caching the TLS session per (host, port). Sessions
+    can only be resumed with the context which created them, hence the
+    contexts are shared, see :func:`context`.
+    '''
+
+    sslsocket_class = _ResumingSocket
+
+    def __init__(self, protocol):
+        self._sessions = dict()
+
+    def _save(self, key, session):
+        with _lock:
+            self._sessions[key] = session
+
+    def wrap_socket(self, sock, *args, **kwargs):
+        peer = sock.getpeername()
+        key = (kwargs.get('server_hostname') or peer[0], peer[1])
+        with _lock:
+            session = self._sessions.get(key)
+        if session is not None and kwargs.get('session') is None:
+            kwargs['session'] = session
+
+        ssl_sock = super(_ResumingContext, self).wrap_socket(sock, *args,
+                                                             **kwargs)
+        ssl_sock._resume = (self, key)
+        resumed = ssl_sock.session_reused
+        with _lock:
+            counts = _stats.setdefault(key, dict(handshakes=0, resumed=0))
+            counts['resumed' if resumed else 'handshakes'] += 1
+        logging.debug("TLS to {} {}".format(
+            key, 'resumed' if resumed else 'full handshake'))
+        return ssl_sock
+
+
+def context(verify=True, cert=None):
+    '''Return the shared resuming SSL context for the given trust
+    setting. Certificates loaded into a context by one session apply
+    to all sessions using it, so every distinct verify value (bool or
+    CA bundle path) and client certificate gets a context of its own.
+
+    :param verify: verify certificate and hostname? (bool) or the
+                   path to a CA bundle (str)
+    :param cert: client certificate as passed to requests, if any
+    :rtype: ssl.SSLContext
+    '''
+    if isinstance(cert, list):
+        cert = tuple(cert)
+    key = (verify, cert)
+    with _lock:
+        ctx = _contexts.get(key)
+        if ctx is None:
+            ctx = _ResumingContext(ssl.PROTOCOL_TLS_CLIENT)
+            # the order matters, no hostname check without verification
+            ctx.check_hostname = bool(verify)
+            ctx.verify_mode = ssl.CERT_REQUIRED if verify else ssl.CERT_NONE
+            _contexts[key] = ctx
+    return ctx
+
+
+def stats(host=None, port=443):
+    '''Return the handshake statistics, either of all hosts as a dict
+    (host, port) -> counts or the counts of the given host. Counts is
+    a dict with the number of full handshakes and resumed sessions.
+
+    :param host: host name or IP as used for the connection (str)
+    :param port: port of the host (int)
+    :rtype: dict
+    '''
+    with _lock:
+        if host is None:
+            return dict((key, dict(counts)) for key, counts in _stats.items())
+        return dict(_stats.get((host, port), dict(handshakes=0, resumed=0)))
+
+
+class ResumingAdapter(HTTPAdapter):
+    '''Transport adapter using the shared resuming SSL context and
+    keeping connections alive in a (small) pool.
+
+    :param verify: verify certificate and hostname? (bool) or the
+                   path to a CA bundle (str)
+    :param cert: client certificate as passed to requests, if any
+    :param \*\*kwargs: Optional arguments that ``HTTPAdapter`` takes,
+                       e.g. pool_maxsize and pool_block.
+    '''
+
+    def __init__(self, verify=True, cert=None, **kwargs):
+        self._ssl_context = context(verify, cert)
+        super(ResumingAdapter, self).__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs['ssl_context'] = self._ssl_context
+        return super(ResumingAdapter, self).init_poolmanager(*args, **kwargs)